@@ -20,20 +20,25 @@
 Checks a UM land fraction or land mask file matches the values Oasis is using
 """
 
-import mule
-import xarray
-import matplotlib.pyplot as plt
 import argparse
-import numpy
 
 
 def check_mask(oasis, um, oasis_grid='um_t'):
+    import mule
+    import numpy
+    import xarray
+    import matplotlib.pyplot as plt
+
     oasis_mask = xarray.open_dataset(oasis)[f'{oasis_grid}.msk']
 
-    um_mask = numpy.where(mule.AncilFile.from_file(
-        um).fields[0].get_data() < 1, 1, 0)
+    um_mask = (mule.AncilFile.from_file(
+        um).fields[0].get_data() < 1).astype(numpy.uint8)
+
+    # Compute 1 - oasis_mask - um_mask in a single buffer
+    diff = numpy.subtract(1, oasis_mask.values, dtype='i4')
+    diff -= um_mask
 
-    plt.pcolormesh(1 - oasis_mask - um_mask)
+    plt.pcolormesh(diff)
     plt.colorbar()
     plt.show()
 
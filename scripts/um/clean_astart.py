@@ -36,8 +36,9 @@ class CleanAstartOperator(mule.DataOperator):
         data = source.get_data()
 
         if source.lbuser4 == 241:
-            # Snow capacity must be >= 0
-            data = numpy.where(data > 0, data, 0)
+            # Snow capacity must be >= 0 (NaN becomes 0), clamp in place to
+            # avoid a copy
+            numpy.fmax(data, 0, out=data)
 
         return data
 
@@ -20,33 +20,7 @@
 Remove masked values from an ancil file using nearest grid point interpolation
 """
 
-import mule
-import numpy
-import xarray
 import argparse
-from coecms.grid import LonLatGrid
-from coecms.regrid import esmf_generate_weights, regrid
-
-
-class RegridOperator(mule.DataOperator):
-    def __init__(self, weights):
-        super()
-        self.weights = weights
-
-    def new_field(self, source):
-        return source.copy()
-
-    def transform(self, source, dest):
-        data = xarray.DataArray(
-            source.get_data().astype('f4'), dims=['lat', 'lon'])
-
-        newdata = regrid(data, weights=self.weights).values
-
-        if source.lbuser4 in [217]:
-            # Floor of 0
-            newdata = numpy.where(newdata > 0, newdata, 0)
-
-        return newdata
 
 
 def demask(input_path, output_path):
@@ -54,17 +28,26 @@ def demask(input_path, output_path):
     Remove a mask from a UM ancil file by doing a one-to-one regrid from a
     masked field to an unmasked field with extrapolation
     """
+    import mule
+    import numpy
+    import xarray
+    from coecms.grid import LonLatGrid
+    from coecms.regrid import esmf_generate_weights, regrid
+
     anc = mule.AncilFile.from_file(input_path)
 
     field0 = anc.fields[0]
-    mask = numpy.where(field0.get_data() == -1073741824, 0, 1)
+    data0 = field0.get_data()
+    mask = (data0 != data0.dtype.type(field0.bmdi)).astype(numpy.uint8)
 
     lats = xarray.DataArray(
-        field0.bzy + (1 + numpy.array(range(mask.shape[0]))) * field0.bdy,
+        field0.bzy + numpy.arange(1, mask.shape[0] + 1, dtype='f8') * field0.bdy,
         dims='lat')
     lons = xarray.DataArray(
-        field0.bzx + (1 + numpy.array(range(mask.shape[1]))) * field0.bdx,
+        field0.bzx + numpy.arange(1, mask.shape[1] + 1, dtype='f8') * field0.bdx,
         dims='lon')
+    lats.attrs['standard_name'] = 'latitude'
+    lons.attrs['standard_name'] = 'longitude'
 
     src_grid = LonLatGrid(lats=lats, lons=lons, mask=mask).to_scrip()
     tgt_grid = LonLatGrid(lats=lats, lons=lons).to_scrip()
@@ -72,7 +55,13 @@ def demask(input_path, output_path):
     weights = esmf_generate_weights(src_grid, tgt_grid, method='neareststod',
                                     line_type='greatcircle', extrap_method='neareststod')
 
-    op = RegridOperator(weights=weights)
+    # Regrid all of the fields at once
+    data = xarray.DataArray(
+        numpy.stack([f.get_data().astype('f4') for f in anc.fields]),
+        dims=['field', 'lat', 'lon'],
+        coords={'lat': lats, 'lon': lons})
+
+    newdata = regrid(data, weights=weights).values
 
     anc_out = anc.copy()
 
@@ -80,8 +69,14 @@ def demask(input_path, output_path):
         pass
     anc_out.validate = no_validate
 
-    for f in anc.fields:
-        anc_out.fields.append(op(f))
+    for f, d in zip(anc.fields, newdata):
+        if f.lbuser4 in [217]:
+            # Floor of 0, NaN becomes 0
+            numpy.fmax(d, 0, out=d)
+
+        new_field = f.copy()
+        new_field.set_data_provider(mule.ArrayDataProvider(d))
+        anc_out.fields.append(new_field)
     anc_out.to_file(output_path)
 
 
@@ -20,11 +20,7 @@
 Set up ERA-Interim SSTs and sea ice for a UM run
 """
 
-from coecms.regrid import esmf_generate_weights, regrid
 import argparse
-import xarray
-import iris
-from dask.diagnostics import ProgressBar
 
 def main():
     parser = argparse.ArgumentParser(description=__doc__)
@@ -36,11 +32,26 @@ def main():
                         type=int, help='Update frequency (hours)', default=24)
     args = parser.parse_args()
 
-    # Read in the source mask
+    from coecms.regrid import esmf_generate_weights, regrid
+    import xarray
+    import iris
+    from dask.diagnostics import ProgressBar
+
+    # The ERA-Interim files all share the same grid, so skip comparing the
+    # non-time variables between every file when concatenating
+    unchecked_concat = {'data_vars': 'minimal', 'coords': 'minimal', 'compat': 'override'}
+
+    # Read in the source data, which also provides the source mask
     tos = xarray.open_mfdataset('/g/data1a/ub4/erai/netcdf/6hr/ocean/'
                                 'oper_an_sfc/v01/tos/'
                                 'tos_6hrs_ERAI_historical_an-sfc_2001*.nc',
-                                coords='all')
+                                combine='by_coords', parallel=True,
+                                **unchecked_concat)
+    sic = xarray.open_mfdataset('/g/data1a/ub4/erai/netcdf/6hr/seaIce/'
+                                'oper_an_sfc/v01/sic/'
+                                'sic_6hrs_ERAI_historical_an-sfc_2001*.nc',
+                                combine='by_coords', parallel=True,
+                                **unchecked_concat)
     src_mask = tos.tos.isel(time=0)
 
     # Read in the target mask
@@ -61,23 +72,26 @@ def main():
 
     with ProgressBar():
 
-        # Read and slice the source data
-        tos = xarray.open_mfdataset('/g/data1a/ub4/erai/netcdf/6hr/ocean/'
-                                    'oper_an_sfc/v01/tos/'
-                                    'tos_6hrs_ERAI_historical_an-sfc_2001*.nc',
-                                    coords='all')
-        sic = xarray.open_mfdataset('/g/data1a/ub4/erai/netcdf/6hr/seaIce/'
-                                    'oper_an_sfc/v01/sic/'
-                                    'sic_6hrs_ERAI_historical_an-sfc_2001*.nc',
-                                    coords='all')
+        # Slice the source data
         ds = xarray.Dataset({'tos': tos.tos, 'sic': sic.sic})
         ds = ds.sel(time=slice(args.start_date, args.end_date))
         print(ds)
 
         newds = regrid(ds, weights=weights)
 
-        newds['time'] = newds['time'].astype('i4')
-        newds.to_netcdf(args.output)
+        # Store time as integer hours with proper units, pack the fields to
+        # 16 bit integers (0.01 K for SST, 0.0001 for sea ice fraction) and
+        # write the output chunk by chunk rather than loading it all into
+        # memory
+        encoding = {
+            'time': {'dtype': 'i4', 'units': 'hours since 1900-01-01'},
+            'tos': {'dtype': 'i2', 'scale_factor': 0.01, 'add_offset': 273.15,
+                    '_FillValue': -32768, 'zlib': True, 'complevel': 1},
+            'sic': {'dtype': 'i2', 'scale_factor': 0.0001,
+                    '_FillValue': -32768, 'zlib': True, 'complevel': 1},
+            }
+        write = newds.to_netcdf(args.output, encoding=encoding, compute=False)
+        write.compute()
 
 if __name__ == '__main__':
     main()
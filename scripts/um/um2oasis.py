@@ -24,9 +24,37 @@ Oasis masks.nc, grids.nc and areas.nc input files and conservative and patch
 regridding weight files
 """
 
-from coecms.um.um2oasis import *
 import argparse
+import concurrent.futures
 import os
+import tempfile
+
+
+def _gen_and_write(source, target, cache_dir, esmf_args, outfile):
+    """
+    Generate the weights from ``source`` to ``target`` and save them in SCRIP
+    format to ``outfile``
+    """
+    from coecms.regrid import esmf_generate_weights
+    from coecms.um.um2oasis import rename_weights_esmf_to_scrip
+
+    weights = esmf_generate_weights(source, target, cache_dir=cache_dir, **esmf_args)
+
+    # Compress the sparse matrix, keeping full precision for Oasis
+    encoding = {v: {'zlib': True, 'complevel': 1}
+                for v in ['remap_matrix', 'src_address', 'dst_address']}
+
+    rename_weights_esmf_to_scrip(weights).to_netcdf(outfile, encoding=encoding)
+
+
+def _available_cpus():
+    """
+    Number of CPUs this process may run on
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        # Only the CPUs we're allowed to use on a shared node
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
 
 
 def main():
@@ -37,6 +65,11 @@ def main():
     parser.add_argument('--output','-o', required=True, help='Output directory')
     args = parser.parse_args()
 
+    from coecms.um.um2oasis import (create_um_lfrac_from_mom, correct_ancils,
+                                    um_endgame_scrip_grids, mom_t_scrip_grid,
+                                    merge_scrip_for_oasis)
+    import iris
+    import xarray
 
     maskfile = args.lfrac
     frac_iris = iris.load_cube(maskfile, iris.AttributeConstraint(STASH='m01s00i505'))
@@ -44,7 +77,8 @@ def main():
     frac_iris.coord('longitude').var_name = 'lon'
     um_grid = xarray.DataArray.from_iris(frac_iris)
 
-    mom_gridspec = xarray.open_dataset(args.mom)
+    # Every grid built from the gridspec uses all of it, so read it once
+    mom_gridspec = xarray.open_dataset(args.mom).load()
 
     lfrac = create_um_lfrac_from_mom(mom_gridspec, um_grid)
     correct_ancils(lfrac, mask_ancil=args.lmask, frac_ancil=args.lfrac, outdir=args.output)
@@ -54,51 +88,63 @@ def main():
 
     oasis_grids = merge_scrip_for_oasis(scrip_grids)
 
-    oasis_grids['masks'].to_netcdf(os.path.join(args.output, 'masks.nc'))
-    oasis_grids['grids'].to_netcdf(os.path.join(args.output, 'grids.nc'))
-    oasis_grids['areas'].to_netcdf(os.path.join(args.output, 'areas.nc'))
+    # Compress the grid files, with one chunk per horizontal slice
+    for ds in oasis_grids.values():
+        for v in ds.data_vars.values():
+            v.encoding.update({'zlib': True, 'complevel': 1,
+                               'chunksizes': (1,) * (v.ndim - 2) + v.shape[-2:]})
+
+    cache_dir = os.path.join(args.output, '.weights_cache')
+
+    conserve_args = {
+            'method': 'conserve',
+            'norm_type': 'fracarea',
+            'extrap_method': 'none',
+            'ignore_unmapped': False,
+            }
+    patch_args = {
+            'method': 'patch',
+            'extrap_method': 'nearestidavg',
+            'line_type': 'greatcircle',
+            'pole': 'none',
+            'ignore_unmapped': True,
+            }
+
+    # (source, target, ESMF options, output file) for each weights file
+    jobs = []
 
     for grid in ['um_t']:
-        weights = esmf_generate_weights(
-                scrip_grids['momt'].reset_index('grid_size'),
-                scrip_grids[grid].reset_index('grid_size'),
-                method='conserve',
-                norm_type='fracarea',
-                extrap_method='none',
-                ignore_unmapped=False,
-                )
-        rename_weights_esmf_to_scrip(weights).to_netcdf(os.path.join(args.output,f'rmp_momt_to_{grid}_CONSERV_FRACAREA.nc'))
-        weights = esmf_generate_weights(
-                scrip_grids[grid].reset_index('grid_size'),
-                scrip_grids['momt'].reset_index('grid_size'),
-                method='conserve',
-                norm_type='fracarea',
-                extrap_method='none',
-                ignore_unmapped=False,
-                )
-        rename_weights_esmf_to_scrip(weights).to_netcdf(os.path.join(args.output,f'rmp_{grid}_to_momt_CONSERV_FRACAREA.nc'))
+        jobs.append(('momt', grid, conserve_args, f'rmp_momt_to_{grid}_CONSERV_FRACAREA.nc'))
+        jobs.append((grid, 'momt', conserve_args, f'rmp_{grid}_to_momt_CONSERV_FRACAREA.nc'))
 
     for grid in ['um_t', 'um_u', 'um_v']:
-        weights = esmf_generate_weights(
-                scrip_grids['momt'].reset_index('grid_size'),
-                scrip_grids[grid].reset_index('grid_size'),
-                method='patch',
-                extrap_method='nearestidavg',
-                line_type='greatcircle',
-                pole='none',
-                ignore_unmapped=True,
-                )
-        rename_weights_esmf_to_scrip(weights).to_netcdf(os.path.join(args.output,f'rmp_momt_to_{grid}_PATCH.nc'))
-        weights = esmf_generate_weights(
-                scrip_grids[grid].reset_index('grid_size'),
-                scrip_grids['momt'].reset_index('grid_size'),
-                method='patch',
-                extrap_method='nearestidavg',
-                line_type='greatcircle',
-                pole='none',
-                ignore_unmapped=True,
-                )
-        rename_weights_esmf_to_scrip(weights).to_netcdf(os.path.join(args.output,f'rmp_{grid}_to_momt_PATCH.nc'))
+        jobs.append(('momt', grid, patch_args, f'rmp_momt_to_{grid}_PATCH.nc'))
+        jobs.append((grid, 'momt', patch_args, f'rmp_{grid}_to_momt_PATCH.nc'))
+
+    # The weights are independent of each other, so generate them in parallel,
+    # writing each grid once for all of the ESMF runs
+    with tempfile.TemporaryDirectory() as grid_dir, \
+            concurrent.futures.ProcessPoolExecutor(max_workers=min(len(jobs), _available_cpus())) as pool:
+        grid_files = {}
+        for k, v in scrip_grids.items():
+            grid_files[k] = os.path.join(grid_dir, f'{k}.nc')
+            v.to_netcdf(grid_files[k])
+
+        futures = [pool.submit(_gen_and_write,
+                               grid_files[src],
+                               grid_files[tgt],
+                               cache_dir,
+                               esmf_args,
+                               os.path.join(args.output, outfile))
+                   for src, tgt, esmf_args, outfile in jobs]
+
+        # Write the Oasis grid files while the weights are being generated
+        xarray.save_mfdataset(
+                [oasis_grids[k] for k in ['masks', 'grids', 'areas']],
+                [os.path.join(args.output, f'{k}.nc') for k in ['masks', 'grids', 'areas']])
+
+        for f in futures:
+            f.result()
 
 if __name__ == '__main__':
     main()
@@ -18,7 +18,6 @@ setup(
             'numpy',
             'pytest',
             'scipy',
-            'sparse',
             'xarray',
             'whichcraft;python_version<"3.3"'
             ],
@@ -21,13 +21,13 @@ from ..grid import UMGrid
 from ..regrid import regrid, esmf_generate_weights
 from ..um.create_ancillary import create_surface_ancillary
 import click
+import concurrent.futures
+import os
 import pandas
 import mule
 import iris
 import xarray
 from dask.diagnostics import ProgressBar
-import dask.distributed
-import matplotlib.pyplot as plt
 
 @cli.group()
 def um():
@@ -47,6 +47,14 @@ def validate_date(ctx, param, value):
     """
     Ensures an argument is a valid date
     """
+    # Try the common ISO formats directly before falling back to pandas'
+    # format inference
+    for fmt in ['%Y%m%d', '%Y-%m-%d']:
+        try:
+            return pandas.to_datetime(value, format=fmt, utc=True)
+        except ValueError:
+            pass
+
     try:
         return pandas.to_datetime(value, utc=True, dayfirst=True)
     except ValueError:
@@ -73,31 +81,38 @@ def era_sst(start_date, end_date, target_mask, output):
     Create ancil files from ERA reanalysis data
     """
 
-    um_grid = UMGrid.from_mask(target_mask)
+    # Load the target mask in the background while the source files are
+    # opened
+    mask_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    um_grid_future = mask_pool.submit(UMGrid.from_mask, target_mask)
+    mask_pool.shutdown(wait=False)
 
     file_start = start_date - pandas.offsets.MonthBegin()
     file_end = end_date + pandas.offsets.MonthEnd()
     file_a = pandas.date_range(file_start,file_end,freq='MS')
     file_b = file_a + pandas.offsets.MonthEnd()
 
-    dates = [f'{a.strftime("%Y%m%d")}_{b.strftime("%Y%m%d")}'
-             for a,b in zip(file_a, file_b)]
+    dates = file_a.strftime('%Y%m%d') + '_' + file_b.strftime('%Y%m%d')
 
     # Read and slice the source data
     tos = xarray.open_mfdataset(['/g/data1a/ub4/erai/netcdf/6hr/ocean/'
                                  'oper_an_sfc/v01/tos/'
                                  'tos_6hrs_ERAI_historical_an-sfc_'+d+'.nc'
                                  for d in dates],
-                                 chunks={'time': 1,})
+                                 chunks={'time': 1,}, parallel=True)
     sic = xarray.open_mfdataset(['/g/data1a/ub4/erai/netcdf/6hr/seaIce/'
                                  'oper_an_sfc/v01/sic/'
                                  'sic_6hrs_ERAI_historical_an-sfc_'+d+'.nc'
                                  for d in dates],
-                                 chunks={'time': 1,})
+                                 chunks={'time': 1,}, parallel=True)
     ds = xarray.Dataset({'tos': tos.tos, 'sic': sic.sic})
     ds = ds.sel(time=slice(start_date, end_date))
 
-    weights = esmf_generate_weights(tos.tos.isel(time=0), um_grid, method='patch')
+    um_grid = um_grid_future.result()
+
+    weights = esmf_generate_weights(tos.tos.isel(time=0), um_grid,
+                                    method='patch',
+                                    cache_dir=os.path.expanduser('~/.cache/coecms'))
     newds = regrid(ds, weights=weights)
 
     print(newds)
@@ -19,6 +19,31 @@ from cfunits import Units
 import numpy
 
 
+def _degenerate_axes(data):
+    """
+    Find the degenerate axes of an array, where all the values along an axis
+    are identical
+
+    Axes are checked in order, with earlier degenerate axes already removed
+
+    Args:
+        data (numpy.ndarray): Array to check
+
+    Returns:
+        list of the degenerate axis numbers
+    """
+
+    degenerate = []
+    for i in range(data.ndim):
+        # Position of the axis once earlier degenerate axes are removed
+        j = i - len(degenerate)
+        if numpy.array_equal(numpy.nanmax(data, axis=j), numpy.nanmin(data, axis=j)):
+            data = data.take(0, axis=j)
+            degenerate.append(i)
+
+    return degenerate
+
+
 def remove_degenerate_axes(coord):
     """
     Remove any degenerate axes from the coordinate, where all the values along a dimension are identical
@@ -30,9 +55,14 @@ def remove_degenerate_axes(coord):
         xarray.DataArray with degenerate axes removed
     """
 
-    for d in coord.dims:
-        if numpy.allclose(coord.std(dim=d), 0):
-            coord = coord.mean(dim=d)
+    # Check the values with numpy, rather than through xarray reductions
+    dims = [coord.dims[i] for i in _degenerate_axes(numpy.asarray(coord))]
+
+    # Take the first slice, dropping coordinates along the axes like a
+    # reduction would
+    coord = coord.drop_vars([k for k, v in coord.coords.items()
+                             if any(d in v.dims for d in dims)])
+    coord = coord.isel({d: 0 for d in dims})
 
     return coord
 
@@ -21,6 +21,7 @@ import xarray
 import numpy
 import iris
 import mule
+import netCDF4
 import os
 
 
@@ -52,11 +53,10 @@ def identify_grid(dataset):
     except AttributeError:
         pass
 
-    try:
-        if dataset.lon.ndim == 1 and dataset.lat.ndim == 1:
-            return LonLatGrid(lons=dataset.lon, lats=dataset.lat)
-    except AttributeError:
-        pass
+    lon = getattr(dataset, 'lon', None)
+    lat = getattr(dataset, 'lat', None)
+    if lon is not None and lat is not None and lon.ndim == 1 and lat.ndim == 1:
+        return LonLatGrid(lons=lon, lats=lat)
 
     raise NotImplementedError
 
@@ -107,67 +107,88 @@ class LonLatGrid(Grid):
         Args:
             lats (numpy.array): Grid latitudes
             lons (numpy.array): Grid longitude
+            mask (numpy.array): Grid mask, 1 for valid points. If not given
+                all points are valid
         """
 
         self.lats = lats
         self.lons = lons
         self.mask = mask
 
-        if self.mask is None:
-            self.mask = numpy.ones((self.lons.size, self.lats.size))
-
         if self.lats.ndim != 1 or self.lons.ndim != 1:
             raise Exception("Lons and Lats must be 1D")
 
     def to_cdo_grid(self, outfile):
-        outfile.write('gridtype = lonlat\n'.encode())
-
-        outfile.write(('xsize = %d\n' % len(self.lons)).encode())
-        outfile.write(('xvals = %s\n' % (','.join(['%f' % x for x in self.lons]))).encode())
+        xvals = numpy.char.mod('%f', numpy.asarray(self.lons, dtype='f8'))
+        yvals = numpy.char.mod('%f', numpy.asarray(self.lats, dtype='f8'))
 
-        outfile.write(('ysize = %d\n' % len(self.lats)).encode())
-        outfile.write(('yvals = %s\n' % (','.join(['%f' % x for x in self.lats]))).encode())
+        outfile.write(('gridtype = lonlat\n'
+                       'xsize = %d\n'
+                       'xvals = %s\n'
+                       'ysize = %d\n'
+                       'yvals = %s\n' % (xvals.size, ','.join(xvals),
+                                          yvals.size, ','.join(yvals))).encode())
 
         outfile.flush()
 
     def to_netcdf(self, outfile):
-        ds = xarray.DataArray(data=numpy.zeros((len(self.lats), len(self.lons))),
-                              coords=[('lat', self.lats), ('lon', self.lons)])
-        ds.lat.attrs['units'] = 'degrees_north'
-        ds.lon.attrs['units'] = 'degrees_east'
-        ds.to_netcdf(outfile)
+        with netCDF4.Dataset(outfile, 'w') as nc:
+            nc.createDimension('lat', len(self.lats))
+            nc.createDimension('lon', len(self.lons))
+
+            lat = nc.createVariable('lat', 'f8', ('lat',))
+            lat.units = 'degrees_north'
+            lat[:] = numpy.asarray(self.lats)
+
+            lon = nc.createVariable('lon', 'f8', ('lon',))
+            lon.units = 'degrees_east'
+            lon[:] = numpy.asarray(self.lons)
+
+            # Sample field on the grid. Written as zeros without a _FillValue,
+            # so CDO doesn't treat any of it as missing
+            var = nc.createVariable('var', 'f8', ('lat', 'lon'), fill_value=False)
+            var[:] = 0
 
     def to_scrip(self):
-        lat = self.lats
-        lon = self.lons % 360
+        lat = numpy.asarray(self.lats)
+        lon = numpy.asarray(self.lons) % 360
 
-        top = (lat.shift(lat=-1) + lat) / 2.0
+        top = numpy.empty(lat.shape)
+        top[:-1] = (lat[1:] + lat[:-1]) / 2.0
         top[-1] = 90
 
-        bot = (lat.shift(lat=1) + lat) / 2.0
+        bot = numpy.empty(lat.shape)
+        bot[1:] = top[:-1]
         bot[0] = -90
 
-        left = ((lon - (lon - lon.roll(lon=1).values) % 360) / 2.0)
-        right = (lon + ((lon.roll(lon=-1).values - lon) % 360) / 2.0)
+        left = lon - ((lon - numpy.roll(lon, 1)) % 360) / 2.0
+        right = lon + ((numpy.roll(lon, -1) - lon) % 360) / 2.0
 
-        center_lon, center_lat = numpy.meshgrid(lon, lat)
+        center_lat = numpy.repeat(lat, lon.size)
+        center_lon = numpy.tile(lon, lat.size)
 
-        corner_lon0, corner_lat0 = numpy.meshgrid(left, bot)
-        corner_lon1, corner_lat1 = numpy.meshgrid(right, bot)
-        corner_lon2, corner_lat2 = numpy.meshgrid(right, top)
-        corner_lon3, corner_lat3 = numpy.meshgrid(left, top)
+        # Corners start at the bottom left, working anticlockwise
+        corner_lat = numpy.empty((lat.size, lon.size, 4))
+        corner_lat[:, :, 0:2] = bot[:, numpy.newaxis, numpy.newaxis]
+        corner_lat[:, :, 2:4] = top[:, numpy.newaxis, numpy.newaxis]
 
-        corner_lat = numpy.array([x.reshape(-1) for x in [corner_lat0, corner_lat1, corner_lat2, corner_lat3]])
-        corner_lon = numpy.array([x.reshape(-1) for x in [corner_lon0, corner_lon1, corner_lon2, corner_lon3]])
+        corner_lon = numpy.empty((lat.size, lon.size, 4))
+        corner_lon[:, :, [0, 3]] = left[:, numpy.newaxis]
+        corner_lon[:, :, [1, 2]] = right[:, numpy.newaxis]
+
+        if self.mask is None:
+            imask = numpy.ones(center_lat.size, dtype='i4')
+        else:
+            imask = numpy.asarray(self.mask).reshape(-1).astype('i4')
 
         scrip = xarray.Dataset(
             coords={
                 'grid_dims': (['grid_rank'], numpy.array([lon.size, lat.size],dtype='i4')),
-                'grid_center_lat': (['grid_size'], center_lat.reshape(-1)),
-                'grid_center_lon': (['grid_size'], center_lon.reshape(-1)),
-                'grid_imask': (['grid_size'], self.mask.reshape(-1).astype('i4')),
-                'grid_corner_lat': (['grid_size', 'grid_corners'], corner_lat.T),
-                'grid_corner_lon': (['grid_size', 'grid_corners'], corner_lon.T),
+                'grid_center_lat': (['grid_size'], center_lat),
+                'grid_center_lon': (['grid_size'], center_lon),
+                'grid_imask': (['grid_size'], imask),
+                'grid_corner_lat': (['grid_size', 'grid_corners'], corner_lat.reshape(-1, 4)),
+                'grid_corner_lon': (['grid_size', 'grid_corners'], corner_lon.reshape(-1, 4)),
             })
 
         scrip.grid_center_lat.attrs['units'] = 'degrees'
@@ -20,21 +20,103 @@ from .grid import *
 
 from datetime import datetime
 from shutil import which
-import dask.array
+import hashlib
 import math
 import os
-import sparse
+import scipy.sparse
 import subprocess
 import sys
 import tempfile
 import xarray
 
 
+def _hash_grid(h, grid):
+    """
+    Add the coordinates (with their attributes) and mask of ``grid`` to the
+    hash ``h``
+    """
+    if isinstance(grid, str):
+        # Path to a grid file
+        with open(grid, 'rb') as f:
+            h.update(f.read())
+        return
+
+    if isinstance(grid, Grid):
+        grid = grid.to_scrip()
+
+    if isinstance(grid, xarray.DataArray):
+        # A sample field, only its name and mask are used for the weights
+        h.update(str(grid.name).encode())
+        h.update(grid.notnull().values.tobytes())
+        variables = grid.coords
+    else:
+        variables = grid.variables
+
+    for k, v in sorted(variables.items(), key=lambda kv: str(kv[0])):
+        # Scalar coordinates like a selected time don't affect the weights
+        if v.ndim == 0:
+            continue
+        h.update(str(k).encode())
+        h.update(numpy.ascontiguousarray(v.values).tobytes())
+        # Metadata like the units changes how the values are interpreted
+        h.update(repr(sorted(v.attrs.items(), key=lambda kv: str(kv[0]))).encode())
+
+
+def _weights_cache_path(cache_dir, generator, source_grid, target_grid, options):
+    """
+    Path of the cached weights file for regridding ``source_grid`` to
+    ``target_grid`` with ``generator`` and ``options``
+    """
+    h = hashlib.blake2b(digest_size=20)
+    h.update(generator.encode())
+    for grid in [source_grid, target_grid]:
+        _hash_grid(h, grid)
+    h.update(repr(sorted(options.items())).encode())
+
+    return os.path.join(cache_dir, f'{generator}_{h.hexdigest()}.nc')
+
+
+def _read_weights_cache(cache_path):
+    """
+    Load cached weights from ``cache_path``, or None if there is no usable
+    cached file
+    """
+    if not os.path.exists(cache_path):
+        return None
+    try:
+        with xarray.open_dataset(cache_path) as weights:
+            return weights.load()
+    except (OSError, ValueError):
+        # Unreadable file, treat it as a cache miss and regenerate
+        return None
+
+
+def _write_weights_cache(weights, cache_path):
+    """
+    Save ``weights`` to ``cache_path``
+
+    The file is written to a temporary name then moved into place, so an
+    interrupted write never leaves a partial file in the cache
+    """
+    cache_dir = os.path.dirname(cache_path)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.nc')
+    os.close(fd)
+    try:
+        weights.to_netcdf(tmp_path)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
 def cdo_generate_weights(source_grid, target_grid,
         method='bil',
         extrapolate=True,
         remap_norm='fracarea',
-        remap_area_min=0.0):
+        remap_area_min=0.0,
+        cache_dir=None):
     """
     Generate weights for regridding using CDO
 
@@ -59,6 +141,8 @@ def cdo_generate_weights(source_grid, target_grid,
         extrapolate (bool): Extrapolate output field
         remap_norm (str): Normalisation method for conservative methods
         remap_area_min (float): Minimum destination area fraction
+        cache_dir (str): If set, re-use weights from previous calls with the
+            same grids and options saved in this directory
 
     Returns:
         :obj:`xarray.Dataset` with regridding weights
@@ -70,36 +154,50 @@ def cdo_generate_weights(source_grid, target_grid,
     if remap_norm not in ['fracarea', 'destarea']:
         raise Exception
 
-    # Make some temporary files that we'll feed to CDO
-    source_grid_file = tempfile.NamedTemporaryFile()
-    target_grid_file = tempfile.NamedTemporaryFile()
-    weight_file = tempfile.NamedTemporaryFile()
-
-    source_grid.to_netcdf(source_grid_file.name)
-    target_grid.to_netcdf(target_grid_file.name)
-
-    # Setup environment
-    env = os.environ
-    if extrapolate:
-        env['REMAP_EXTRAPOLATE'] = 'on'
-    else:
-        env['REMAP_EXTRAPOLATE'] = 'off'
-
-    env['CDO_REMAP_NORM'] = remap_norm
-    env['REMAP_AREA_MIN'] = '%f' % (remap_area_min)
+    if cache_dir is not None:
+        cache_path = _weights_cache_path(cache_dir, 'cdo',
+            source_grid, target_grid,
+            {'method': method, 'extrapolate': extrapolate,
+             'remap_norm': remap_norm, 'remap_area_min': remap_area_min})
+        weights = _read_weights_cache(cache_path)
+        if weights is not None:
+            return weights
+
+    # Make a temporary directory for the files that we'll feed to CDO
+    tmpdir = tempfile.TemporaryDirectory()
+    source_grid_file = os.path.join(tmpdir.name, 'source_grid.nc')
+    target_grid_file = os.path.join(tmpdir.name, 'target_grid.nc')
+    weight_file = os.path.join(tmpdir.name, 'weights.nc')
+
+    # Setup environment for CDO, without changing our own
+    env = {
+        **os.environ,
+        'REMAP_EXTRAPOLATE': 'on' if extrapolate else 'off',
+        'CDO_REMAP_NORM': remap_norm,
+        'REMAP_AREA_MIN': '%f' % (remap_area_min),
+        }
 
     try:
+        source_grid.to_netcdf(source_grid_file)
+        target_grid.to_netcdf(target_grid_file)
+
         # Run CDO
         subprocess.check_output([
             "cdo",
-            "gen%s,%s" % (method, target_grid_file.name),
-            source_grid_file.name,
-            weight_file.name],
+            "gen%s,%s" % (method, target_grid_file),
+            source_grid_file,
+            weight_file],
             stderr=subprocess.PIPE,
             env=env)
 
-        # Grab the weights file it outputs as a xarray.Dataset
-        weights = xarray.open_dataset(weight_file.name)
+        # Grab the weights file it outputs as a xarray.Dataset, loading it
+        # and closing the file so we can delete the temp file
+        with xarray.open_dataset(weight_file) as weights:
+            weights.load()
+
+        if cache_dir is not None:
+            _write_weights_cache(weights, cache_path)
+
         return weights
 
     except subprocess.CalledProcessError as e:
@@ -109,9 +207,25 @@ def cdo_generate_weights(source_grid, target_grid,
 
     finally:
         # Clean up the temporary files
-        source_grid_file.close()
-        target_grid_file.close()
-        weight_file.close()
+        tmpdir.cleanup()
+
+
+def _write_esmf_grid(grid, path):
+    """
+    Write ``grid`` to ``path`` for ESMF, unless it is already a path to a
+    grid file
+
+    Returns:
+        Path to the grid file
+    """
+    if isinstance(grid, str):
+        return grid
+
+    if '_FillValue' not in grid.encoding:
+        grid.encoding['_FillValue'] = -999999
+
+    grid.to_netcdf(path)
+    return path
 
 
 def esmf_generate_weights(
@@ -123,11 +237,16 @@ def esmf_generate_weights(
         line_type=None,
         pole=None,
         ignore_unmapped=False,
+        cache_dir=None,
+        processes=1,
         ):
     """Generate regridding weights with ESMF
 
     https://www.earthsystemcog.org/projects/esmf/regridding
 
+    The grids may also be given as paths to netCDF files ESMF can read, e.g.
+    to write a grid once when generating weights with multiple methods.
+
     Args:
         source_grid (:obj:`xarray.Dataarray`): Source grid. If masked the mask
             will be used in the regridding
@@ -135,35 +254,43 @@ def esmf_generate_weights(
             will be used in the regridding
         method (str): ESMF Regridding method, see ``ESMF_RegridWeightGen --help``
         extrap_method (str): ESMF Extrapolation method, see ``ESMF_RegridWeightGen --help``
+        cache_dir (str): If set, re-use weights from previous calls with the
+            same grids and options saved in this directory
+        processes (int): Number of MPI processes to run ESMF with
 
     Returns:
         :obj:`xarray.Dataset` with regridding information from
             ESMF_RegridWeightGen
     """
-    # Make some temporary files that we'll feed to ESMF
-    source_file = tempfile.NamedTemporaryFile()
-    target_file = tempfile.NamedTemporaryFile()
-    weight_file = tempfile.NamedTemporaryFile()
+    if cache_dir is not None:
+        cache_path = _weights_cache_path(cache_dir, 'esmf',
+            source_grid, target_grid,
+            {'method': method, 'extrap_method': extrap_method,
+             'norm_type': norm_type, 'line_type': line_type, 'pole': pole,
+             'ignore_unmapped': ignore_unmapped})
+        weights = _read_weights_cache(cache_path)
+        if weights is not None:
+            return weights
+
+    # Make a temporary directory for the files that we'll feed to ESMF
+    tmpdir = tempfile.TemporaryDirectory()
+    weight_file = os.path.join(tmpdir.name, 'weights.nc')
 
     rwg = 'ESMF_RegridWeightGen'
 
     if which(rwg) is None:
         rwg = '/apps/esmf/7.1.0r-intel/bin/binO/Linux.intel.64.openmpi.default/ESMF_RegridWeightGen'
 
-    if '_FillValue' not in source_grid.encoding:
-        source_grid.encoding['_FillValue'] = -999999
-
-    if '_FillValue' not in target_grid.encoding:
-        target_grid.encoding['_FillValue'] = -999999
-
     try:
-        source_grid.to_netcdf(source_file.name)
-        target_grid.to_netcdf(target_file.name)
+        source_path = _write_esmf_grid(source_grid,
+                                       os.path.join(tmpdir.name, 'source.nc'))
+        target_path = _write_esmf_grid(target_grid,
+                                       os.path.join(tmpdir.name, 'target.nc'))
 
         command = [rwg,
-            '--source', source_file.name,
-            '--destination', target_file.name,
-            '--weight', weight_file.name,
+            '--source', source_path,
+            '--destination', target_path,
+            '--weight', weight_file,
             '--method', method,
             '--extrap_method', extrap_method,
             '--norm_type', norm_type,
@@ -192,14 +319,22 @@ def esmf_generate_weights(
             command.extend([
                 '--pole',pole,
                 ])
+        if processes > 1:
+            # ESMF partitions the grids between the MPI ranks
+            command = ['mpirun', '-np', str(processes)] + command
 
         out = subprocess.check_output(args=command,
             stderr=subprocess.PIPE)
         print(out.decode('utf-8'))
 
-        weights = xarray.open_dataset(weight_file.name)
-        # Load so we can delete the temp file
-        return weights.load()
+        # Load and close the file so we can delete the temp file
+        with xarray.open_dataset(weight_file) as weights:
+            weights.load()
+
+        if cache_dir is not None:
+            _write_weights_cache(weights, cache_path)
+
+        return weights
 
     except subprocess.CalledProcessError as e:
         print(e)
@@ -208,21 +343,64 @@ def esmf_generate_weights(
 
     finally:
         # Clean up the temporary files
-        source_file.close()
-        target_file.close()
-        weight_file.close()
+        tmpdir.cleanup()
 
 
-def apply_weights(source_data, weights):
+def _apply_weight_matrix(source, weight_matrix, masked_points, target_shape,
+                         nearest_points=None):
     """
-    Apply the CDO weights ``weights`` to ``source_data``, performing a regridding operation
+    Regrid the last two axes of ``source`` using the sparse matrix
+    ``weight_matrix``
 
     Args:
-        source_data (xarray.Dataset): Source dataset
-        weights (xarray.Dataset): CDO weights information
+        source (numpy.ndarray): Source data, with the horizontal grid as the
+            last two axes
+        weight_matrix (scipy.sparse.csr_matrix): Weights, shape (n_b, n_a)
+        masked_points (numpy.ndarray): Indices of masked target points
+        target_shape (tuple): Shape of the target horizontal grid
+        nearest_points (numpy.ndarray): If the weights just copy a single
+            source point to each target point, the source point indices
 
     Returns:
-        xarray.Dataset: Regridded version of the source dataset
+        numpy.ndarray with the last two axes on the target grid
+    """
+    kept_shape = source.shape[:-2]
+
+    source_2d = source.reshape(-1, source.shape[-2] * source.shape[-1])
+
+    if nearest_points is not None:
+        # No need for the matrix multiply, just take the source points
+        dtype = numpy.result_type(source.dtype, weight_matrix.dtype)
+        target_2d = source_2d[:, nearest_points].astype(dtype)
+        numpy.copyto(target_2d, 0, where=~numpy.isfinite(target_2d))
+        target_2d[:, masked_points] = numpy.nan
+
+        return target_2d.reshape(kept_shape + tuple(target_shape))
+
+    # Put the horizontal grid first, so that each weight gets applied to a
+    # contiguous row of the other dimensions
+    source_t = numpy.array(source_2d.T, order='C')
+
+    # Missing source points don't contribute to the target
+    if numpy.issubdtype(source_t.dtype, numpy.inexact):
+        numpy.copyto(source_t, 0, where=~numpy.isfinite(source_t))
+
+    target_t = weight_matrix.dot(source_t)
+    target_t[masked_points] = numpy.nan
+
+    return target_t.T.reshape(kept_shape + tuple(target_shape))
+
+
+def _prepare_weights(weights):
+    """
+    Extract the sparse weight matrix and target grid information from a
+    weights file, so it can be re-used by :func:`apply_weights`
+
+    Args:
+        weights (xarray.Dataset): CDO or ESMF weights information
+
+    Returns:
+        dict with the weight matrix and target grid information
     """
     # Alias the weights dataset from CDO
     w = weights
@@ -230,10 +408,8 @@ def apply_weights(source_data, weights):
     # The weights file contains a sparse matrix, that we need to multiply the
     # source data's horizontal grid with to get the regridded data.
     #
-    # A bit of messing about with `.stack()` is needed in order to get the
-    # dimensions to conform - the horizontal grid needs to be converted to a 1d
-    # array, multiplied by the weights matrix, then unstacked back into a 2d
-    # array
+    # The horizontal grid needs to be converted to a 1d array, multiplied by
+    # the weights matrix, then reshaped back into a 2d array
 
     if w.title.startswith('ESMF'):
         # ESMF style weights
@@ -250,7 +426,7 @@ def apply_weights(source_data, weights):
 
         dst_mask = w.mask_b
 
-        axis_scale = 1  # Weight lat/lon in degrees
+        dst_grid_units = w.yc_b.attrs.get('units', 'degrees')
 
     else:
         # CDO style weights
@@ -267,71 +443,132 @@ def apply_weights(source_data, weights):
 
         dst_mask = w.dst_grid_imask
 
-        axis_scale = 180.0 / math.pi  # Weight lat/lon in radians
-
-    # Check lat/lon are the last axes
-    source_lat, source_lon = identify_lat_lon(source_data)
-    if not (source_lat.name in source_data.dims[-2:] and
-            source_lon.name in source_data.dims[-2:]):
-        raise Exception("Last two dimensions should be spatial coordinates,"
-                        f" got {source_data.dims[-2:]}")
-
-    kept_shape = list(source_data.shape[0:-2])
-    kept_dims = list(source_data.dims[0:-2])
-
-    # Create a sparse array from the weights
-    sparse_weights = sparse.COO([src_address.data, dst_address.data],
-                               remap_matrix.data,
-                               shape=w_shape,
-                               )
-
-    # Remove the spatial axes, apply the weights, add the spatial axes back
-    source_array = source_data.data
-    if isinstance(source_array, dask.array.Array):
-        source_array = dask.array.reshape(source_array,
-                kept_shape +  [-1])
+        dst_grid_units = w.dst_grid_center_lat.attrs.get('units', 'radians')
+
+    # Create a sparse matrix from the weights, mapping source points (columns)
+    # to target points (rows)
+    weight_matrix = scipy.sparse.coo_matrix(
+        (remap_matrix.data, (dst_address.data, src_address.data)),
+        shape=(w_shape[1], w_shape[0])).tocsr()
+
+    # Combine duplicate links and sort the columns within each row, so the
+    # source is read in order when applying the weights
+    weight_matrix.sum_duplicates()
+
+    # Nearest neighbour weights copy one source point to each target point
+    nearest_points = None
+    if (numpy.all(numpy.diff(weight_matrix.indptr) == 1)
+            and numpy.all(weight_matrix.data == 1)):
+        nearest_points = weight_matrix.indices
+
+    # Target coordinates, converted to degrees. Regular grids should use 'lat',
+    # 'lon' as dimension names, curved grids use 'i', 'j'
+    lat = remove_degenerate_axes(xarray.DataArray(dst_grid_center_lat,
+                                                  dims=['i', 'j']))
+    lon = remove_degenerate_axes(xarray.DataArray(dst_grid_center_lon,
+                                                  dims=['i', 'j']))
+    if lat.ndim == 1 and lon.ndim == 1:
+        dims = ['lat', 'lon']
+        rename = {'i': 'lat', 'j': 'lon'}
+        lat = xarray.DataArray(lat.values, dims=[rename[d] for d in lat.dims])
+        lon = xarray.DataArray(lon.values, dims=[rename[d] for d in lon.dims])
     else:
-        source_array = numpy.reshape(source_array, kept_shape + [-1])
+        dims = ['i', 'j']
 
-    # Handle input mask
-    dask.array.ma.set_fill_value(source_array, 1e20)
-    source_array = dask.array.ma.fix_invalid(source_array)
-    source_array = dask.array.ma.filled(source_array)
+    # Convert to degrees if needed
+    if dst_grid_units.startswith('radian'):
+        lat = lat * (180.0 / math.pi)
+        lon = lon * (180.0 / math.pi)
 
-    target_dask = dask.array.tensordot(source_array, sparse_weights, axes=1)
-    target_dask = dask.array.reshape(target_dask,
-            kept_shape + [dst_grid_shape[1], dst_grid_shape[0]])
+    # Add metadata to the coordinates
+    lat.attrs['units'] = 'degrees_north'
+    lat.attrs['standard_name'] = 'latitude'
+    lon.attrs['units'] = 'degrees_east'
+    lon.attrs['standard_name'] = 'longitude'
+
+    return {
+        'src_grid_shape': tuple(int(d) for d in w.src_grid_dims.data[::-1]),
+        'weight_matrix': weight_matrix,
+        # Single precision data is regridded with single precision weights,
+        # halving the memory traffic
+        'weight_matrix_f4': weight_matrix.astype('f4'),
+        'dst_grid_shape': dst_grid_shape,
+        'dims': dims,
+        'lat': lat,
+        'lon': lon,
+        'masked_points': numpy.flatnonzero(dst_mask.data != 1),
+        'nearest_points': nearest_points,
+        }
 
-    # Create a new DataArray for the output
-    target_da = xarray.DataArray(target_dask,
-                                 dims=kept_dims + ['i', 'j'],
-                                 coords={k:v for k,v in source_data.coords.items()
-                                     if set(v.dims).issubset(kept_dims)},
-                                 name=source_data.name)
-    target_da.coords['lat'] = xarray.DataArray(dst_grid_center_lat, dims=['i','j'])
-    target_da.coords['lon'] = xarray.DataArray(dst_grid_center_lon, dims=['i','j'])
 
-    # Mask
-    target_da = target_da.where(dst_mask.data.reshape([dst_grid_shape[1], dst_grid_shape[0]]) == 1)
+def apply_weights(source_data, weights):
+    """
+    Apply the weights ``weights`` to ``source_data``, performing a regridding operation
 
-    # Clean up coordinates
-    target_da.coords['lat'] = remove_degenerate_axes(target_da.lat)
-    target_da.coords['lon'] = remove_degenerate_axes(target_da.lon)
+    Args:
+        source_data (xarray.Dataset): Source dataset
+        weights (xarray.Dataset or dict): CDO or ESMF weights information, or
+            the already prepared weights from :func:`_prepare_weights` to
+            re-use the sparse matrix between calls
 
-    # Convert to degrees if needed
-    target_da.coords['lat'] = target_da.lat * axis_scale
-    target_da.coords['lon'] = target_da.lon * axis_scale
+    Returns:
+        xarray.Dataset: Regridded version of the source dataset
+    """
+    if isinstance(weights, xarray.Dataset):
+        weights = _prepare_weights(weights)
 
-    # Regular grids should use 'lat', 'lon' as dimension names, curved grids
-    # use 'i', 'j'
-    if target_da.coords['lat'].ndim == 1 and target_da.coords['lon'].ndim == 1:
-        target_da = target_da.rename({'i': 'lat', 'j': 'lon'})
+    if (numpy.issubdtype(source_data.dtype, numpy.floating)
+            and source_data.dtype.itemsize <= 4):
+        weight_matrix = weights['weight_matrix_f4']
+    else:
+        weight_matrix = weights['weight_matrix']
+    dst_grid_shape = weights['dst_grid_shape']
 
-    # Add metadata to the coordinates
-    target_da.coords['lat'].attrs['units'] = 'degrees_north'
-    target_da.coords['lat'].attrs['standard_name'] = 'latitude'
-    target_da.coords['lon'].attrs['units'] = 'degrees_east'
-    target_da.coords['lon'].attrs['standard_name'] = 'longitude'
+    # Check lat/lon are the last axes
+    source_lat, source_lon = identify_lat_lon(source_data)
+    if not (source_lat.name in source_data.dims[-2:] and
+            source_lon.name in source_data.dims[-2:]):
+        raise Exception("Last two dimensions should be spatial coordinates,"
+                        f" got {source_data.dims[-2:]}")
+
+    # Check the source grid matches the weights
+    if tuple(source_data.shape[-2:]) != weights['src_grid_shape']:
+        raise Exception("Source grid shape doesn't match the weights,"
+                        f" got {tuple(source_data.shape[-2:])}"
+                        f" expected {weights['src_grid_shape']}")
+
+    target_shape = (dst_grid_shape[1], dst_grid_shape[0])
+
+    # The horizontal axes can't be split when applying the weights. If they
+    # are, merge them while letting dask re-chunk the other dimensions to keep
+    # within its configured chunk size
+    horizontal_dims = source_data.dims[-2:]
+    if source_data.chunks is not None and any(
+            len(source_data.chunksizes[d]) > 1 for d in horizontal_dims):
+        source_data = source_data.chunk(
+            {d: -1 if d in horizontal_dims else 'auto'
+             for d in source_data.dims})
+
+    # Apply the weights to each chunk of the source data. The horizontal axes
+    # can't be split, dask will parallelise over the other dimensions
+    target_da = xarray.apply_ufunc(
+        _apply_weight_matrix, source_data,
+        kwargs={'weight_matrix': weight_matrix,
+                'masked_points': weights['masked_points'],
+                'nearest_points': weights['nearest_points'],
+                'target_shape': target_shape},
+        input_core_dims=[list(source_data.dims[-2:])],
+        output_core_dims=[weights['dims']],
+        exclude_dims=set(source_data.dims[-2:]),
+        dask='parallelized',
+        output_dtypes=[numpy.result_type(source_data.dtype, weight_matrix.dtype)],
+        dask_gufunc_kwargs={
+            'output_sizes': dict(zip(weights['dims'], target_shape)),
+            },
+        )
+
+    target_da.coords['lat'] = weights['lat']
+    target_da.coords['lon'] = weights['lon']
 
     return target_da
 
@@ -352,9 +589,12 @@ class Regridder(object):
         source_grid (:class:`coecms.grid.Grid` or :class:`xarray.DataArray`): Source grid / sample dataset
         target_grid (:class:`coecms.grid.Grid` or :class:`xarray.DataArray`): Target grid / sample dataset
         weights (:class:`xarray.Dataset`): Pre-computed interpolation weights
+        cache_dir (str): If set, save generated weights in this directory and
+            re-use them when regridding between the same grids again
     """
 
-    def __init__(self, source_grid=None, target_grid=None, weights=None):
+    def __init__(self, source_grid=None, target_grid=None, weights=None,
+                 cache_dir=None):
 
         if (source_grid is None or target_grid is None) and weights is None:
             raise Exception(
@@ -362,12 +602,16 @@ class Regridder(object):
 
         # Is there already a weights file?
         if weights is not None:
-            self.weights = weights
+            self.weights = weights.load()
         else:
             # Generate the weights with CDO
             _source_grid = identify_grid(source_grid)
             _target_grid = identify_grid(target_grid)
-            self.weights = cdo_generate_weights(_source_grid, _target_grid)
+            self.weights = cdo_generate_weights(_source_grid, _target_grid,
+                                                cache_dir=cache_dir).load()
+
+        # Set up the sparse matrix once for all calls to regrid()
+        self._weights = _prepare_weights(self.weights)
 
     def regrid(self, source_data):
         """Regrid ``source_data`` to match the target grid
@@ -382,28 +626,54 @@ class Regridder(object):
         """
 
         if isinstance(source_data, xarray.Dataset):
-            return source_data.apply(self.regrid)
+            # Variables with the same dimensions get regridded together
+            groups = {}
+            for name, var in source_data.data_vars.items():
+                groups.setdefault((var.dims, var.dtype, var.chunks), []).append(name)
+
+            regridded = {}
+            for names in groups.values():
+                if len(names) == 1:
+                    regridded[names[0]] = self.regrid(source_data[names[0]])
+                    continue
+
+                stacked = xarray.concat([source_data[n] for n in names],
+                                        dim='_variable', coords='minimal',
+                                        compat='override')
+                if stacked.chunks is not None:
+                    stacked = stacked.chunk({'_variable': -1})
+
+                result = self.regrid(stacked)
+                for i, n in enumerate(names):
+                    # concat keeps only the first variable's attributes
+                    regridded[n] = result.isel(_variable=i, drop=True).rename(n)
+                    regridded[n].attrs = dict(source_data[n].attrs)
+
+            return xarray.Dataset(regridded)
         else:
-            return apply_weights(source_data, self.weights)
+            return apply_weights(source_data, self._weights)
 
 
-def regrid(source_data, target_grid=None, weights=None):
+def regrid(source_data, target_grid=None, weights=None, cache_dir=None):
     """
     A simple regrid. Inefficient if you are regridding more than one dataset
     to the target grid because it re-generates the weights each time you call
     the function.
 
-    To save the weights use :class:`Regridder`.
+    To save the weights use :class:`Regridder`, or set ``cache_dir`` to
+    re-use weights saved to disk by previous calls.
 
     Args:
         source_data (:class:`xarray.DataArray`): Source variable
         target_grid (:class:`coecms.grid.Grid` or :class:`xarray.DataArray`): Target grid / sample variable
+        cache_dir (str): Directory to save generated weights in
 
     Returns:
         :class:`xarray.DataArray` with a regridded version of the source variable
     """
 
     regridder = Regridder(
-        source_data, target_grid=target_grid, weights=weights)
+        source_data, target_grid=target_grid, weights=weights,
+        cache_dir=cache_dir)
 
     return regridder.regrid(source_data)
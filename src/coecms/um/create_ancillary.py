@@ -26,8 +26,6 @@ from coecms.dimension import identify_lat_lon, identify_time
 
 import mule
 import numpy
-import xarray
-import dask.array
 
 
 def create_surface_ancillary(input_ds, stash_map):
@@ -62,6 +60,19 @@ def create_surface_ancillary(input_ds, stash_map):
 
     tstep = (time[1] - time[0]) / numpy.timedelta64(1, 's')
 
+    # Date of each time step, used for both the file header and the fields
+    years = time.dt.year.values
+    months = time.dt.month.values
+    days = time.dt.day.values
+    hours = time.dt.hour.values
+    minutes = time.dt.minute.values
+    seconds = time.dt.second.values
+
+    lats = lat.values
+    lons = lon.values
+    dlat = lats[1] - lats[0]
+    dlon = lons[1] - lons[0]
+
     template = {
         'fixed_length_header': {
             'sub_model': 1,         # Atmosphere
@@ -72,19 +83,19 @@ def create_surface_ancillary(input_ds, stash_map):
             'time_type': 1,         # Time series
             'model_version': 1006,  # UM 10.6
             # Start time
-            't1_year': time.dt.year.values[0],
-            't1_month': time.dt.month.values[0],
-            't1_day': time.dt.day.values[0],
-            't1_hour': time.dt.hour.values[0],
-            't1_minute': time.dt.minute.values[0],
-            't1_second': time.dt.second.values[0],
+            't1_year': years[0],
+            't1_month': months[0],
+            't1_day': days[0],
+            't1_hour': hours[0],
+            't1_minute': minutes[0],
+            't1_second': seconds[0],
             # End time
-            't2_year': time.dt.year.values[-1],
-            't2_month': time.dt.month.values[-1],
-            't2_day': time.dt.day.values[-1],
-            't2_hour': time.dt.hour.values[-1],
-            't2_minute': time.dt.minute.values[-1],
-            't2_second': time.dt.second.values[-1],
+            't2_year': years[-1],
+            't2_month': months[-1],
+            't2_day': days[-1],
+            't2_hour': hours[-1],
+            't2_minute': minutes[-1],
+            't2_second': seconds[-1],
             # Frequency (must be sub-daily)
             't3_year': 0,
             't3_month': 0,
@@ -101,10 +112,10 @@ def create_surface_ancillary(input_ds, stash_map):
             'num_field_types': len(stash_map),
         },
         'real_constants': {
-            'start_lat': lat.values[0] + (lat.values[1] - lat.values[0])/2.0,
-            'row_spacing': lat.values[1] - lat.values[0],
-            'start_lon': lon.values[0] + (lon.values[1] - lon.values[0])/2.0,
-            'col_spacing': lon.values[1] - lon.values[0],
+            'start_lat': lats[0] + dlat/2.0,
+            'row_spacing': dlat,
+            'start_lon': lons[0] + dlon/2.0,
+            'col_spacing': dlon,
             'north_pole_lat': 90,
             'north_pole_lon': 0,
         },
@@ -115,49 +126,54 @@ def create_surface_ancillary(input_ds, stash_map):
     # UM Missing data magic value
     MDI = -1073741824.0
 
-    for var, stash in stash_map.items():
-        # Mask out NANs with MDI
-        var_data = xarray.where(dask.array.isnan(
-            input_ds[var]), MDI, input_ds[var])
+    # Header values shared by every field
+    prototype = mule.Field3.empty()
 
-        for t in var_data[time.name]:
-            field = mule.Field3.empty()
+    prototype.lbtime = 1        # Instantaneous Gregorian calendar
+    prototype.lbcode = 1        # Regular Lat-Lon grid
+    prototype.lbhem = 0         # Global
 
-            field.lbyr = t.dt.year.values
-            field.lbmon = t.dt.month.values
-            field.lbdat = t.dt.day.values
-            field.lbhr = t.dt.hour.values
-            field.lbmin = t.dt.minute.values
-            field.lbsec = t.dt.second.values
+    prototype.lbrow = ancil.integer_constants.num_rows
+    prototype.lbnpt = ancil.integer_constants.num_cols
 
-            field.lbtime = 1        # Instantaneous Gregorian calendar
-            field.lbcode = 1        # Regular Lat-Lon grid
-            field.lbhem = 0         # Global
+    prototype.lbpack = 0        # No packing
+    prototype.lbrel = 3         # UM 8.1 or later
+    prototype.lbvc = 129        # Surface field
 
-            field.lbrow = ancil.integer_constants.num_rows
-            field.lbnpt = ancil.integer_constants.num_cols
+    prototype.lbuser1 = 1       # Real data
+    prototype.lbuser7 = 1       # Atmosphere model
 
-            field.lbpack = 0        # No packing
-            field.lbrel = 3         # UM 8.1 or later
-            field.lbvc = 129        # Surface field
+    prototype.bplat = ancil.real_constants.north_pole_lat
+    prototype.bplon = ancil.real_constants.north_pole_lon
 
-            field.lbuser1 = 1       # Real data
-            field.lbuser4 = stash   # STASH code
-            field.lbuser7 = 1       # Atmosphere model
+    prototype.bdx = ancil.real_constants.col_spacing
+    prototype.bdy = ancil.real_constants.row_spacing
+    prototype.bzx = ancil.real_constants.start_lon - prototype.bdx / 2.0
+    prototype.bzy = ancil.real_constants.start_lat - prototype.bdy / 2.0
 
-            field.bplat = ancil.real_constants.north_pole_lat
-            field.bplon = ancil.real_constants.north_pole_lon
+    prototype.bmdi = MDI
+    prototype.bmks = 1.0
 
-            field.bdx = ancil.real_constants.col_spacing
-            field.bdy = ancil.real_constants.row_spacing
-            field.bzx = ancil.real_constants.start_lon - field.bdx / 2.0
-            field.bzy = ancil.real_constants.start_lat - field.bdy / 2.0
+    for var, stash in stash_map.items():
+        # Mask out NANs with MDI, loading the whole variable once rather
+        # than evaluating the mask separately for each time step
+        var_data = input_ds[var].transpose(time.name, ...).values
+        var_data = numpy.where(numpy.isnan(var_data), MDI, var_data)
+
+        for i in range(time.size):
+            field = prototype.copy()
 
-            field.bmdi = MDI
-            field.bmks = 1.0
+            field.lbyr = years[i]
+            field.lbmon = months[i]
+            field.lbdat = days[i]
+            field.lbhr = hours[i]
+            field.lbmin = minutes[i]
+            field.lbsec = seconds[i]
+
+            field.lbuser4 = stash   # STASH code
 
             field.set_data_provider(
-                mule.ArrayDataProvider(var_data.sel({time.name: t})))
+                mule.ArrayDataProvider(var_data[i]))
 
             ancil.fields.append(field)
 
@@ -26,9 +26,9 @@ from __future__ import print_function
 
 import xarray
 import numpy as np
-import pandas
 import numpy
 import mule
+import os
 from coecms.regrid import esmf_generate_weights, regrid
 
 
@@ -45,44 +45,66 @@ def latlon_scrip_grid(mask, planet_radius=6371229.0):
     Returns:
         xarray.DataArray containing the SCRIP description
     """
-    dims = ['ny', 'nx']
-
     dlat = (mask.lat[1] - mask.lat[0]).data
     dlon = (mask.lon[1] - mask.lon[0]).data
 
-    lo, la = np.meshgrid(mask.lon, mask.lat)
-
-    mask = xarray.DataArray(numpy.logical_not(mask.data), dims=dims)
-
-    grid_dims = xarray.DataArray(list(reversed(mask.shape)), dims=['grid_rank'])
-
-    lo = xarray.DataArray(lo, dims=dims)
-    lo.attrs['units'] = 'degrees'
-    la = xarray.DataArray(la, dims=dims)
-    la.attrs['units'] = 'degrees'
-
-    # Find the cell corners (starting at the bottom left, working anticlockwise)
-    clo = xarray.DataArray(np.stack([lo-dlon/2, lo+dlon/2, lo+dlon/2, lo-dlon/2]),
-            dims=['grid_corners', dims[0], dims[1]])
-    clo.attrs['units'] = 'degrees'
-    cla = xarray.DataArray(np.clip(np.stack([la-dlat/2, la-dlat/2, la+dlat/2, la+dlat/2]), -90, 90),
-            dims=['grid_corners', dims[0], dims[1]])
-    cla.attrs['units'] = 'degrees'
-
-    # Calculate the cell area
+    # Work on the 1d coordinates, broadcasting them rather than building full
+    # 2d copies with meshgrid. The arrays are built directly in the flattened
+    # SCRIP layout, with 'grid_size' running over (ny, nx)
+    ny, nx = mask.shape
+    lon = mask.lon.values[np.newaxis, :]
+    lat = mask.lat.values[:, np.newaxis]
+
+    lo = np.broadcast_to(lon, (ny, nx)).reshape(-1)
+    lo = xarray.DataArray(lo, dims=['grid_size'], attrs={'units': 'degrees'})
+    la = np.broadcast_to(lat, (ny, nx)).reshape(-1)
+    la = xarray.DataArray(la, dims=['grid_size'], attrs={'units': 'degrees'})
+
+    # SCRIP masks are integers, 1 for active points
+    mask = xarray.DataArray((mask.data == 0).astype('i4').reshape(-1), dims=['grid_size'])
+
+    grid_dims = xarray.DataArray([nx, ny], dims=['grid_rank'])
+
+    # Find the cell corners (starting at the bottom left, working
+    # anticlockwise), writing them straight into the (grid_size, grid_corners)
+    # layout so they don't need to be transposed
+    lon_w = lon - dlon/2
+    lon_e = lon + dlon/2
+    lat_s = np.clip(lat - dlat/2, -90, 90)
+    lat_n = np.clip(lat + dlat/2, -90, 90)
+
+    clo = np.empty((ny, nx, 4), dtype=np.result_type(lon_w, lon_e))
+    clo[:, :, 0] = lon_w
+    clo[:, :, 1] = lon_e
+    clo[:, :, 2] = lon_e
+    clo[:, :, 3] = lon_w
+    clo = xarray.DataArray(clo.reshape(-1, 4), dims=['grid_size', 'grid_corners'],
+            attrs={'units': 'degrees'})
+
+    cla = np.empty((ny, nx, 4), dtype=np.result_type(lat_s, lat_n))
+    cla[:, :, 0] = lat_s
+    cla[:, :, 1] = lat_s
+    cla[:, :, 2] = lat_n
+    cla[:, :, 3] = lat_n
+    cla = xarray.DataArray(cla.reshape(-1, 4), dims=['grid_size', 'grid_corners'],
+            attrs={'units': 'degrees'})
+
+    # Calculate the cell area - this only varies with latitude, so is
+    # calculated on the 1d coordinate and broadcast along the rows
     dlonr = dlon / 180.0 * np.pi
-    la_low = np.clip((la - dlat/2) / 180 * np.pi, -np.pi/2, np.pi/2)
-    la_high = np.clip((la + dlat/2) / 180 * np.pi, -np.pi/2, np.pi/2)
+    la_low = np.clip((lat - dlat/2) / 180 * np.pi, -np.pi/2, np.pi/2)
+    la_high = np.clip((lat + dlat/2) / 180 * np.pi, -np.pi/2, np.pi/2)
 
-    area = xarray.DataArray(planet_radius**2 * dlonr * (np.sin(la_high) - np.sin(la_low)), dims=dims)
+    area = np.broadcast_to(planet_radius**2 * dlonr * (np.sin(la_high) - np.sin(la_low)), (ny, nx))
+    area = xarray.DataArray(area.reshape(-1), dims=['grid_size'])
     area.attrs['units'] = 'm^2'
     area.attrs['planet_radius'] = planet_radius
 
     ds = xarray.Dataset({'grid_center_lat': la, 'grid_center_lon': lo, 'grid_corner_lon': clo, 'grid_corner_lat': cla, 'grid_imask': mask, 'grid_area': area, 'grid_dims': grid_dims})
-    ds = ds.stack(grid_size=('ny','nx')).reset_index('grid_size')
 
-    ds['grid_corner_lon'] = ds['grid_corner_lon'].transpose()
-    ds['grid_corner_lat'] = ds['grid_corner_lat'].transpose()
+    # 2d indices of each grid point
+    ds.coords['ny'] = ('grid_size', np.repeat(np.arange(ny), nx))
+    ds.coords['nx'] = ('grid_size', np.tile(np.arange(nx), ny))
 
     return ds
 
@@ -97,15 +119,19 @@ def um_endgame_scrip_grids(frac_t):
     Returns:
         dict mapping UM grid names to SCRIP descriptions of that grid
     """
-    mask_t = xarray.where(frac_t < 1.0, 0, 1).astype('i4')
+    mask_t = frac_t.copy(data=np.where(frac_t.values < 1.0, 0, 1).astype('i4'))
 
-    dlat = (mask_t.lat[1] - mask_t.lat[0]).data
-    dlon = (mask_t.lon[1] - mask_t.lon[0]).data
-    lat_v = np.clip(np.append(mask_t.lat - dlat/2, mask_t.lat[-1] + dlat/2), -90, 90)
-    lon_u = mask_t.lon - dlon/2
+    # Work with the plain coordinate values, the u and v grids are built from
+    # scratch so there's nothing to align
+    lat = mask_t.lat.values
+    lon = mask_t.lon.values
+    dlat = lat[1] - lat[0]
+    dlon = lon[1] - lon[0]
+    lat_v = np.clip(np.append(lat - dlat/2, lat[-1] + dlat/2), -90, 90)
+    lon_u = lon - dlon/2
 
-    mask_v = xarray.DataArray(np.zeros((lat_v.size, mask_t.lon.size), dtype='i4'), coords=[('lat', lat_v), ('lon', mask_t.lon)])
-    mask_u = xarray.DataArray(np.zeros((mask_t.lat.size, lon_u.size), dtype='i4'), coords=[('lat', mask_t.lat), ('lon', lon_u)])
+    mask_v = xarray.DataArray(np.zeros((lat_v.size, lon.size), dtype='i4'), coords=[('lat', lat_v), ('lon', lon)])
+    mask_u = xarray.DataArray(np.zeros((lat.size, lon_u.size), dtype='i4'), coords=[('lat', lat), ('lon', lon_u)])
 
     ds_t = latlon_scrip_grid(mask_t)
     ds_v = latlon_scrip_grid(mask_v)
@@ -128,8 +154,10 @@ def mom_t_scrip_grid(gridspec):
     """
     grid_dims = xarray.DataArray(list(reversed(gridspec.wet.shape)), dims='grid_rank')
 
-    area = gridspec.AREA_OCN.values
-    mask = gridspec.wet
+    # Use the underlying arrays, which stay lazy if gridspec was opened with
+    # dask chunks
+    area = gridspec.AREA_OCN.data
+    mask = gridspec.wet.data
 
     ds = xarray.Dataset({
             'grid_dims': grid_dims,
@@ -154,6 +182,33 @@ def mom_t_scrip_grid(gridspec):
     return ds
 
 
+def _unstack_scrip(scrip, variables, dims=('ny', 'nx')):
+    """
+    Reshape variables of a SCRIP description from the flattened 'grid_size'
+    dimension back to the 2d grid
+
+    Args:
+        scrip (xarray.Dataset): SCRIP grid description
+        variables (list of str): Variables to reshape
+        dims (tuple of str): Names of the 2d (y, x) dimensions
+
+    Returns:
+        dict mapping the names in ``variables`` to xarray.DataArrays on the 2d
+        grid
+    """
+    nx, ny = scrip.grid_dims.values
+
+    out = {}
+    for v in variables:
+        # 'grid_size' is C-ordered over (ny, nx), so this is just a reshape
+        da = scrip[v].transpose(..., 'grid_size')
+        out[v] = xarray.DataArray(da.values.reshape(da.shape[:-1] + (ny, nx)),
+                                  dims=da.dims[:-1] + tuple(dims),
+                                  attrs=da.attrs)
+
+    return out
+
+
 def merge_scrip_for_oasis(scrip_grids):
     """
     Merge a set of SCRIP grids into OASIS grid description files
@@ -165,38 +220,30 @@ def merge_scrip_for_oasis(scrip_grids):
         dict mappining keys 'masks', 'grids' and 'areas' to xarray.DataArrays
         with the relevant fields copied from the SCRIP descriptions
     """
-    masks = xarray.Dataset()
-    grids = xarray.Dataset()
-    areas = xarray.Dataset()
-    
-    for name, scrip in scrip_grids.items():
-        if 'nx' in scrip:
-            del scrip['nx']
-        if 'ny' in scrip:
-            del scrip['ny']
-        if 'grid_corners' in scrip:
-            del scrip['grid_corners']
-
-        scrip['grid_size'] = pandas.MultiIndex.from_product(
-                [range(scrip.grid_dims.values[1]), range(scrip.grid_dims.values[0])],
-                names=['ny','nx'])
-        scrip = scrip.unstack('grid_size').transpose('grid_rank','grid_corners','ny','nx')
-
-        scrip = scrip.rename({v: f'{name}.{v}' for v in scrip.variables})
+    # Collect the variables and build each Dataset once at the end
+    masks = {}
+    grids = {}
+    areas = {}
 
-        del scrip[f'{name}.nx']
-        del scrip[f'{name}.ny']
+    for name, scrip in scrip_grids.items():
+        # Only unstack the variables OASIS needs
+        scrip = _unstack_scrip(scrip,
+                               ['grid_imask', 'grid_center_lon', 'grid_center_lat',
+                                'grid_corner_lon', 'grid_corner_lat', 'grid_area'],
+                               dims=(f'{name}.ny', f'{name}.nx'))
 
-        masks[f'{name}.msk'] = (1 - scrip[f'{name}.grid_imask']).astype('i4')
+        masks[f'{name}.msk'] = (1 - scrip['grid_imask']).astype('i4')
 
-        grids[f'{name}.lon'] = scrip[f'{name}.grid_center_lon'].astype('f8')
-        grids[f'{name}.lat'] = scrip[f'{name}.grid_center_lat'].astype('f8')
-        grids[f'{name}.clo'] = scrip[f'{name}.grid_corner_lon'].astype('f8')
-        grids[f'{name}.cla'] = scrip[f'{name}.grid_corner_lat'].astype('f8')
+        grids[f'{name}.lon'] = scrip['grid_center_lon'].astype('f8')
+        grids[f'{name}.lat'] = scrip['grid_center_lat'].astype('f8')
+        grids[f'{name}.clo'] = scrip['grid_corner_lon'].astype('f8')
+        grids[f'{name}.cla'] = scrip['grid_corner_lat'].astype('f8')
 
-        areas[f'{name}.srf'] = scrip[f'{name}.grid_area'].astype('f8')
+        areas[f'{name}.srf'] = scrip['grid_area'].astype('f8')
 
-    return {'masks': masks, 'grids': grids, 'areas': areas}
+    return {'masks': xarray.Dataset(masks),
+            'grids': xarray.Dataset(grids),
+            'areas': xarray.Dataset(areas)}
 
 
 def rename_weights_esmf_to_scrip(ds):
@@ -234,6 +281,9 @@ def rename_weights_esmf_to_scrip(ds):
         'S': 'remap_matrix',
         })
     ds['remap_matrix'] = ds.remap_matrix.expand_dims('num_wgts').transpose()
+    # Addresses are 32 bit in SCRIP files
+    ds['src_address'] = ds.src_address.astype('i4', copy=False)
+    ds['dst_address'] = ds.dst_address.astype('i4', copy=False)
     ds.attrs['conventions'] = 'SCRIP'
     return ds
 
@@ -287,6 +337,8 @@ class LFracCorrector(mule.DataOperator):
         """
         super()
         self.lfrac = lfrac #: Target land fraction
+        self.land = numpy.asarray(lfrac) > 0 #: Points with any land
+        self.land_mask = numpy.where(self.land, 1, 0) #: Target land mask
 
     def new_field(self, source):
         """
@@ -298,23 +350,26 @@ class LFracCorrector(mule.DataOperator):
         """
         Replaces data in the field with the values from `self.lfrac`
         """
-        data = source.get_data()
-        data_orig = numpy.copy(data)
+        land = self.land
 
+        # Make a single copy of the data and update it in place. Each field
+        # only needs one pass - the new mask and land fraction can't contain
+        # missing values, and orography's missing values are negative so are
+        # already covered by its own correction
         if source.lbuser4 == 30:
             # Land mask
-            data = numpy.where(self.lfrac > 0, 1, 0)
-
-        if source.lbuser4 == 33:
-            # Orography - set to minimum 1 where there's land
-            data = numpy.where(numpy.logical_and(data < 0, self.lfrac > 0), 1, data)
-
-        if source.lbuser4 == 505:
+            data = self.land_mask
+        elif source.lbuser4 == 505:
             # Land fraction
-            data = self.lfrac
-
-        # Remove missing data that's been unmasked
-        data = numpy.where(numpy.logical_and(data == -1073741824, self.lfrac > 0), 0, data)
+            data = numpy.array(self.lfrac)
+        elif source.lbuser4 == 33:
+            # Orography - set to minimum 1 where there's land
+            data = numpy.array(source.get_data())
+            data[(data < 0) & land] = 1
+        else:
+            # Remove missing data that's been unmasked
+            data = numpy.array(source.get_data())
+            data[(data == -1073741824) & land] = 0
 
         return data
 
@@ -28,6 +28,28 @@ import numpy
 import f90nml
 import stratify
 
+
+def _level_heights(Zsea, C, orog):
+    """
+    True height of model levels, ``Zsea + C * orog``
+
+    Computed in a single output array, without a temporary for ``C * orog``
+
+    Args:
+        Zsea (numpy.array): Height of each level above sea level
+        C (numpy.array): Terrain following coefficient of each level
+        orog (numpy.array): 2d surface orography
+
+    Returns:
+        numpy.array with the 3d height of each level
+    """
+    Z = numpy.empty((len(Zsea),) + orog.shape,
+                    dtype=numpy.result_type(Zsea, C, orog))
+    numpy.multiply(C[:, numpy.newaxis, numpy.newaxis], orog, out=Z)
+    Z += Zsea[:, numpy.newaxis, numpy.newaxis]
+    return Z
+
+
 def vertical_interpolate(infile, outfile, orogfile, vertlevs):
     """
     Perform a vertical interpolation of ancil file 'infile', using the level
@@ -42,26 +64,31 @@ def vertical_interpolate(infile, outfile, orogfile, vertlevs):
 
     ancil = mule.AncilFile.from_file(infile)
 
+    # DataFrame column -> field header attribute
+    field_attrs = {
+        'year': 'lbyr',
+        'month': 'lbmon',
+        'day': 'lbdat',
+        'hour': 'lbhr',
+        'minute': 'lbmin',
+        'second': 'lbsec',
+        'stash': 'lbuser4',
+        'vertical_type': 'lbvc',
+        'level': 'lblev',
+        'pseudo': 'lbuser5',
+        #'bulev': 'bulev',
+        'blev': 'blev',
+        'brlev': 'brlev',
+        #'bhulev': 'bhulev',
+        'bhlev': 'bhlev',
+        'bhrlev': 'bhrlev',
+        }
+
     def categorise_fields(m):
-        df = pandas.DataFrame({'field': m.fields})
-        df['year'] = df['field'].apply(lambda f: f.lbyr)
-        df['month'] = df['field'].apply(lambda f: f.lbmon)
-        df['day'] = df['field'].apply(lambda f: f.lbdat)
-        df['hour'] = df['field'].apply(lambda f: f.lbhr)
-        df['minute'] = df['field'].apply(lambda f: f.lbmin)
-        df['second'] = df['field'].apply(lambda f: f.lbsec)
-        df['stash'] = df['field'].apply(lambda f: f.lbuser4)
-        df['vertical_type'] =df['field'].apply(lambda f: f.lbvc)
-        df['level'] = df['field'].apply(lambda f: f.lblev)
-        df['pseudo'] = df['field'].apply(lambda f: f.lbuser5)
-
-        #df['bulev'] = df['field'].apply(lambda f: f.bulev)
-        df['blev'] = df['field'].apply(lambda f: f.blev)
-        df['brlev'] = df['field'].apply(lambda f: f.brlev)
-
-        #df['bhulev'] = df['field'].apply(lambda f: f.bhulev)
-        df['bhlev'] = df['field'].apply(lambda f: f.bhlev)
-        df['bhrlev'] = df['field'].apply(lambda f: f.bhrlev)
+        # Read all the headers in a single pass over the fields
+        rows = [[getattr(f, a) for a in field_attrs.values()] for f in m.fields]
+        df = pandas.DataFrame(rows, columns=list(field_attrs.keys()))
+        df.insert(0, 'field', m.fields)
 
         return df
 
@@ -88,27 +115,45 @@ def vertical_interpolate(infile, outfile, orogfile, vertlevs):
     target_Zsea = target_levels['z_top_of_model'] * eta
     target_C = (1 - eta/eta[const_lev])**2
     target_C[const_lev:] = 0
-    target_Z = target_Zsea[:, numpy.newaxis, numpy.newaxis] + numpy.multiply.outer(target_C,orog)
+    target_Z = _level_heights(target_Zsea, target_C, orog)
 
     ancil_out = ancil.copy()
 
+    # True heights of the source levels, which are usually the same for each
+    # time of a field
+    source_Z = {}
+
+    # Buffer for the source data, re-used between groups of the same shape
+    cube = None
+
     # Group the 2d slices with the same field and time value together
     for name, g in df.groupby(['year','month','day','hour','minute','second', 'stash']):
         print("%04d%02d%02dT%02d:%02d:%02d STASH %d"%name)
 
         # Stack the slices into a 3d array
-        cube = numpy.stack(g['field'].apply(lambda f: f.get_data()))
+        for i, f in enumerate(g['field']):
+            data = f.get_data()
+            if i == 0 and (cube is None or cube.shape != (len(g),) + data.shape
+                           or cube.dtype != data.dtype):
+                cube = numpy.empty((len(g),) + data.shape, dtype=data.dtype)
+            cube[i] = data
 
         # True height of each position
-        Zsea = g['blev']
-        C = g['bhlev']
-        Z = Zsea[:, numpy.newaxis, numpy.newaxis] + numpy.multiply.outer(C,orog)
+        Zsea = g['blev'].values
+        C = g['bhlev'].values
+        key = (Zsea.tobytes(), C.tobytes())
+        if key not in source_Z:
+            source_Z[key] = _level_heights(Zsea, C, orog)
+        Z = source_Z[key]
 
         # Interpolate from the source true height to the target true height
         new_cube = stratify.interpolate(target_Z, Z, cube, axis=0, extrapolation='nearest')
 
+        # Each new level is a copy of the first source level
+        template = g['field'].iloc[0]
+
         for level in range(1,new_cube.shape[0]):
-            f = g.iloc[0].at['field'].copy()
+            f = template.copy()
 
             f.lblev = level+1
             f.blev = target_Zsea[level]
@@ -34,6 +34,21 @@ def test_remove_degenerate_axes():
     numpy.testing.assert_array_equal([1, 2], o.data)
 
 
+def test_degenerate_axes():
+    from coecms.dimension import _degenerate_axes
+
+    assert _degenerate_axes(numpy.array([1, 2])) == []
+    assert _degenerate_axes(numpy.array([[1, 2], [1, 2]])) == [0]
+    assert _degenerate_axes(numpy.array([[1, 1], [2, 2]])) == [1]
+
+    # Axes are checked after earlier degenerate axes are removed
+    assert _degenerate_axes(numpy.ones((2, 3))) == [0, 1]
+
+    # Small differences are not degenerate
+    assert _degenerate_axes(numpy.array([[360.0, 360.001]])) == [0]
+    assert _degenerate_axes(numpy.array([[360.0], [360.001]])) == [1]
+
+
 def test_identify_lat_lon():
     da = xarray.DataArray([[0, 0], [0, 0]],
                           coords=[('lat', [0, 1]), ('lon', [0, 1])])
@@ -16,6 +16,7 @@
 from __future__ import print_function
 
 from coecms.grid import *
+import pytest
 import xarray
 import numpy
 import tempfile
@@ -26,18 +27,42 @@ def test_latlon_grid_to_scrip():
     d.lat.attrs['units'] = 'degrees_north'
     d.lon.attrs['units'] = 'degrees_east'
 
-    center_lon, center_lat = numpy.meshgrid(d.lon, d.lat)
-    d[:, :] = center_lon
+    d[:, :] = d.lon.values[numpy.newaxis, :]
 
     s = identify_grid(d).to_scrip()
 
-    assert s.grid_dims[0] == 4
-    assert s.grid_dims[1] == 2
+    grid_dims = s.grid_dims.values
+    corner_lat = s.grid_corner_lat.values
+    corner_lon = s.grid_corner_lon.values
+
+    assert grid_dims[0] == 4
+    assert grid_dims[1] == 2
 
     # Bottom left corner of bottom left cell
-    assert s.grid_corner_lat[0, 0] == -90
-    assert s.grid_corner_lon[0, 0] == -45
+    assert corner_lat[0, 0] == pytest.approx(-90)
+    assert corner_lon[0, 0] == pytest.approx(-45)
 
     # Top left corner of bottom left cell
-    assert s.grid_corner_lat[0, 3] == 0
-    assert s.grid_corner_lon[0, 3] == -45
+    assert corner_lat[0, 3] == pytest.approx(0)
+    assert corner_lon[0, 3] == pytest.approx(-45)
+
+    # Bottom left corner of the next cell along
+    assert corner_lat[1, 0] == pytest.approx(-90)
+    assert corner_lon[1, 0] == pytest.approx(45)
+
+
+def test_latlon_grid_to_netcdf(tmpdir):
+    d = xarray.DataArray(data=numpy.ones((2, 4)), coords=[('lat', [-45, 45]), ('lon', [0, 90, 180, 270])])
+    d.lat.attrs['units'] = 'degrees_north'
+    d.lon.attrs['units'] = 'degrees_east'
+
+    path = str(tmpdir.join('grid.nc'))
+    identify_grid(d).to_netcdf(path)
+
+    with xarray.open_dataset(path, mask_and_scale=False) as g:
+        numpy.testing.assert_array_equal(g.lat, d.lat)
+        numpy.testing.assert_array_equal(g.lon, d.lon)
+
+        # Sample field is all valid zeros
+        assert '_FillValue' not in g['var'].attrs
+        numpy.testing.assert_array_equal(g['var'], numpy.zeros((2, 4)))
@@ -28,8 +28,7 @@ def test_cdo_generate_weights(tmpdir):
     d.lat.attrs['units'] = 'degrees_north'
     d.lon.attrs['units'] = 'degrees_east'
 
-    center_lon, center_lat = numpy.meshgrid(d.lon, d.lat)
-    d[:, :] = center_lon
+    d[:, :] = d.lon.values[numpy.newaxis, :]
 
     grid = identify_grid(d)
     weights = cdo_generate_weights(d, grid)
@@ -37,6 +36,103 @@ def test_cdo_generate_weights(tmpdir):
     assert 'remap_matrix' in weights
 
 
+def test_cdo_generate_weights_cache(tmpdir):
+    d = xarray.DataArray(data=numpy.ones((2, 4)), coords=[('lat', [-45, 45]), ('lon', [0, 90, 180, 270])])
+    d.lat.attrs['units'] = 'degrees_north'
+    d.lon.attrs['units'] = 'degrees_east'
+
+    grid = identify_grid(d)
+    weights = cdo_generate_weights(d, grid, cache_dir=str(tmpdir))
+    assert len(tmpdir.listdir()) == 1
+
+    # Second call is read from the cache
+    cached = cdo_generate_weights(d, grid, cache_dir=str(tmpdir))
+    assert len(tmpdir.listdir()) == 1
+    xarray.testing.assert_equal(weights, cached)
+
+    # Different options get a new file
+    cdo_generate_weights(d, grid, method='nn', cache_dir=str(tmpdir))
+    assert len(tmpdir.listdir()) == 2
+
+
+def test_weights_cache_path_units(tmpdir):
+    from coecms.regrid import _weights_cache_path
+
+    d = xarray.DataArray(data=numpy.ones((2, 4)), coords=[('lat', [-45, 45]), ('lon', [0, 90, 180, 270])])
+    d.lat.attrs['units'] = 'degrees_north'
+    d.lon.attrs['units'] = 'degrees_east'
+
+    r = d.copy()
+    r.lon.attrs['units'] = 'radians'
+
+    path = _weights_cache_path(str(tmpdir), 'cdo', d, d, {})
+    assert path == _weights_cache_path(str(tmpdir), 'cdo', d.copy(), d, {})
+
+    # Grids differing only in their units get different weights
+    assert path != _weights_cache_path(str(tmpdir), 'cdo', r, d, {})
+
+
+def test_weights_cache_file(tmpdir):
+    from coecms.regrid import _read_weights_cache, _write_weights_cache
+
+    path = str(tmpdir.join('weights.nc'))
+    assert _read_weights_cache(path) is None
+
+    weights = xarray.Dataset({'remap_matrix': (['n'], numpy.arange(4.0))})
+    _write_weights_cache(weights, path)
+    xarray.testing.assert_equal(_read_weights_cache(path), weights)
+
+    # No temporary files are left behind
+    assert len(tmpdir.listdir()) == 1
+
+    # A truncated file is a cache miss rather than an error
+    with open(path, 'wb') as f:
+        f.write(b'CDF')
+    assert _read_weights_cache(path) is None
+
+
+def synthetic_weights(source, target, nearest=False):
+    """
+    CDO format weights from ``source`` to ``target``, without running CDO
+
+    Each target point takes the source point at the same relative position,
+    or with ``nearest=False`` a mix of that point and its eastern neighbour
+    """
+    ny, nx = source.shape[-2:]
+    my, mx = target.shape[-2:]
+
+    j, i = numpy.meshgrid(numpy.arange(my), numpy.arange(mx), indexing='ij')
+    src_j = (j * ny // my).ravel()
+    src_i = (i * nx // mx).ravel()
+    dst = numpy.arange(my * mx)
+
+    if nearest:
+        src_address = src_j * nx + src_i
+        dst_address = dst
+        remap_matrix = numpy.ones(dst.size)
+    else:
+        src_address = numpy.concatenate([src_j * nx + src_i,
+                                         src_j * nx + (src_i + 1) % nx])
+        dst_address = numpy.concatenate([dst, dst])
+        remap_matrix = numpy.concatenate([numpy.full(dst.size, 0.75),
+                                          numpy.full(dst.size, 0.25)])
+
+    lat2d, lon2d = numpy.meshgrid(numpy.deg2rad(target.lat), numpy.deg2rad(target.lon),
+                                  indexing='ij')
+
+    return xarray.Dataset({
+        'src_address': ('num_links', (src_address + 1).astype('i4')),
+        'dst_address': ('num_links', (dst_address + 1).astype('i4')),
+        'remap_matrix': (('num_links', 'num_wgts'), remap_matrix[:, numpy.newaxis]),
+        'src_grid_dims': ('src_grid_rank', numpy.array([nx, ny], dtype='i4')),
+        'dst_grid_dims': ('dst_grid_rank', numpy.array([mx, my], dtype='i4')),
+        'src_grid_center_lat': ('src_grid_size', numpy.zeros(ny * nx)),
+        'dst_grid_center_lat': ('dst_grid_size', lat2d.ravel()),
+        'dst_grid_center_lon': ('dst_grid_size', lon2d.ravel()),
+        'dst_grid_imask': ('dst_grid_size', numpy.ones(my * mx, dtype='i4')),
+        }, attrs={'title': 'CDO remapping'})
+
+
 def compare_regrids(tmpdir, source, target):
     """
     Check our weight application matches CDO's
@@ -136,6 +232,27 @@ def test_dask_regrid(tmpdir):
     assert isinstance(r.data, dask.array.Array)
 
 
+def test_dask_horizontal_chunks():
+    a = xarray.DataArray(
+        numpy.random.rand(4, 10, 11),
+        name='var',
+        dims=['time', 'lat', 'lon'],
+        coords={'lat': numpy.linspace(-90, 90, 10), 'lon': numpy.linspace(0, 360, 11, endpoint=False)})
+    a.lat.attrs['units'] = 'degrees_north'
+    a.lon.attrs['units'] = 'degrees_east'
+
+    b = a.isel(time=0, lat=slice(None, None, 2), lon=slice(None, None, 2))
+
+    weights = synthetic_weights(a, b)
+
+    # Source split along the horizontal axes
+    chunked = a.chunk({'time': 1, 'lat': 5, 'lon': 4})
+    r = regrid(chunked, weights=weights)
+
+    assert isinstance(r.data, dask.array.Array)
+    numpy.testing.assert_array_almost_equal(r, regrid(a, weights=weights))
+
+
 def test_3d_regrid(tmpdir):
     a0 = xarray.DataArray(
         [[[0, 1], [2, 3]], [[4, 5], [6, 7]], [[8, 9], [10, 11]]],
@@ -310,3 +427,93 @@ def test_regrid_weight_gen(weight_gen,weight_args):
     assert numpy.isnan(b[6,4])
 
 
+
+
+def test_regridder_dataset_attrs():
+    lats = [-45, 45]
+    lons = [0, 90, 180, 270]
+
+    ds = xarray.Dataset(
+        {'tos': (['lat', 'lon'], numpy.random.rand(len(lats), len(lons))),
+         'sic': (['lat', 'lon'], numpy.random.rand(len(lats), len(lons)))},
+        coords={'lat': lats, 'lon': lons})
+    ds.lat.attrs['units'] = 'degrees_north'
+    ds.lon.attrs['units'] = 'degrees_east'
+    ds.tos.attrs['units'] = 'K'
+    ds.sic.attrs['units'] = '1'
+
+    # Identity weights
+    weights = synthetic_weights(ds.tos, ds.tos, nearest=True)
+
+    r = Regridder(weights=weights).regrid(ds)
+
+    # Variables regridded together keep their own attributes
+    for name in ['tos', 'sic']:
+        assert r[name].attrs == ds[name].attrs
+        numpy.testing.assert_array_almost_equal(r[name], ds[name])
+
+
+def test_regrid_float32():
+    a = xarray.DataArray(
+        numpy.random.rand(10, 11),
+        name='var',
+        dims=['lat', 'lon'],
+        coords={'lat': numpy.linspace(-90, 90, 10), 'lon': numpy.linspace(0, 360, 11, endpoint=False)})
+    a.lat.attrs['units'] = 'degrees_north'
+    a.lon.attrs['units'] = 'degrees_east'
+
+    b = a.isel(lat=slice(None, None, 2), lon=slice(None, None, 2))
+
+    weights = synthetic_weights(a, b)
+
+    r8 = regrid(a, weights=weights)
+    r4 = regrid(a.astype('f4'), weights=weights)
+
+    # Single precision data is regridded in single precision
+    assert r8.dtype == numpy.float64
+    assert r4.dtype == numpy.float32
+    numpy.testing.assert_allclose(r4, r8, rtol=1e-6)
+
+
+def test_regrid_nearest_points():
+    from coecms.regrid import _prepare_weights
+
+    a = xarray.DataArray(
+        numpy.random.rand(3, 10, 11),
+        name='var',
+        dims=['time', 'lat', 'lon'],
+        coords={'lat': numpy.linspace(-90, 90, 10), 'lon': numpy.linspace(0, 360, 11, endpoint=False)})
+    a.lat.attrs['units'] = 'degrees_north'
+    a.lon.attrs['units'] = 'degrees_east'
+    a[:, 0, 0] = numpy.nan
+
+    b = a.isel(time=0, lat=slice(None, None, 2), lon=slice(None, None, 2))
+
+    weights = synthetic_weights(a, b, nearest=True)
+    weights.dst_grid_imask[5] = 0
+
+    # One weight of 1 per target point takes the gather path
+    prepared = _prepare_weights(weights)
+    assert prepared['nearest_points'] is not None
+
+    r = apply_weights(a, prepared)
+    r_csr = apply_weights(a, dict(prepared, nearest_points=None))
+
+    numpy.testing.assert_array_equal(r, r_csr)
+    assert numpy.isnan(r[:, 0, 5]).all()
+
+
+def test_regrid_wrong_source_grid():
+    a = xarray.DataArray(
+        numpy.random.rand(10, 11),
+        name='var',
+        dims=['lat', 'lon'],
+        coords={'lat': numpy.linspace(-90, 90, 10), 'lon': numpy.linspace(0, 360, 11, endpoint=False)})
+    a.lat.attrs['units'] = 'degrees_north'
+    a.lon.attrs['units'] = 'degrees_east'
+
+    w = cdo_generate_weights(a, a)
+
+    # Source doesn't match the grid used to make the weights
+    with pytest.raises(Exception):
+        regrid(a[1:, :], weights=w)
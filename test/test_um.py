@@ -16,12 +16,19 @@
 from __future__ import print_function
 
 from coecms.um.create_ancillary import *
+from coecms.um.um2oasis import (latlon_scrip_grid, mom_t_scrip_grid,
+                                merge_scrip_for_oasis)
 
+import pytest
 import xarray
 import numpy
 
 
-def test_create_surface_ancillary():
+@pytest.fixture(scope='module')
+def sst_dataset():
+    """
+    Decoded surface dataset, shared between tests as it isn't modified
+    """
     da = xarray.Dataset(
         {'sst': (['time', 'lat', 'lon'], numpy.zeros((3, 3, 3)))},
         coords={
@@ -29,9 +36,68 @@ def test_create_surface_ancillary():
             'lat': ('lat', [1, 2, 3], {'axis': 'Y'}),
             'lon': ('lon', [1, 2, 3], {'axis': 'X'}),
         })
-    da = xarray.decode_cf(da)
+    return xarray.decode_cf(da)
 
-    ancil = create_surface_ancillary(da, {'sst': 507})
 
+@pytest.fixture(scope='module')
+def sst_ancil(sst_dataset):
+    return create_surface_ancillary(sst_dataset, {'sst': 507})
+
+
+def test_create_surface_ancillary(sst_ancil):
     # The file should pass Mule's internal checks
-    ancil.validate()
+    sst_ancil.validate()
+
+
+def test_surface_ancillary_fields(sst_ancil):
+    # One field per time step
+    assert len(sst_ancil.fields) == 3
+
+    for f in sst_ancil.fields:
+        assert f.lbuser4 == 507
+        assert f.lbrow == 3
+        assert f.lbnpt == 3
+        assert f.bdx == 1
+        assert f.bdy == 1
+
+    assert [f.lbdat for f in sst_ancil.fields] == [2, 3, 4]
+    assert sst_ancil.fields[0].lbyr == 1900
+    assert sst_ancil.fields[0].lbmon == 1
+
+
+def test_merge_scrip_for_oasis(tmpdir):
+    mask = xarray.DataArray(numpy.zeros((3, 4), dtype='i4'),
+                            coords=[('lat', [-60, 0, 60]), ('lon', [0, 90, 180, 270])])
+    mask[0, 0] = 1
+
+    # MOM grid_spec.nc, with 2 rows and 3 columns
+    y, x = numpy.meshgrid([-45.0, 45.0], [60.0, 180.0, 300.0], indexing='ij')
+    gridspec = xarray.Dataset({
+        'wet': (['grid_y_T', 'grid_x_T'], numpy.ones((2, 3))),
+        'AREA_OCN': (['grid_y_T', 'grid_x_T'], numpy.ones((2, 3))),
+        'y_T': (['grid_y_T', 'grid_x_T'], y),
+        'x_T': (['grid_y_T', 'grid_x_T'], x),
+        'y_vert_T': (['vertex', 'grid_y_T', 'grid_x_T'], y + numpy.array([-45, -45, 45, 45])[:, None, None]),
+        'x_vert_T': (['vertex', 'grid_y_T', 'grid_x_T'], x + numpy.array([-60, 60, 60, -60])[:, None, None]),
+        })
+
+    scrip_grids = {'um_t': latlon_scrip_grid(mask),
+                   'momt': mom_t_scrip_grid(gridspec)}
+
+    # The SCRIP grids can be written out for ESMF as they are
+    for k, v in scrip_grids.items():
+        v.to_netcdf(str(tmpdir.join(f'{k}.nc')))
+
+    oasis_grids = merge_scrip_for_oasis(scrip_grids)
+
+    assert oasis_grids['masks']['um_t.msk'].dims == ('um_t.ny', 'um_t.nx')
+    assert oasis_grids['masks']['um_t.msk'].shape == (3, 4)
+    assert oasis_grids['masks']['um_t.msk'][0, 0] == 1
+    assert oasis_grids['masks']['um_t.msk'][0, 1] == 0
+
+    assert oasis_grids['grids']['momt.cla'].shape == (4, 2, 3)
+    numpy.testing.assert_array_equal(oasis_grids['grids']['momt.lat'], y)
+    numpy.testing.assert_array_equal(oasis_grids['grids']['momt.lon'], x)
+
+    for k, v in oasis_grids.items():
+        v.to_netcdf(str(tmpdir.join(f'{k}.nc')))